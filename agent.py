@@ -1,96 +1,241 @@
 import os
 import json
-from typing import Dict, List, Tuple, Optional
+import heapq
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Generator, List, Tuple, Optional
 from datetime import datetime, timedelta
-from anthropic import Anthropic
+import httpx
+from anthropic import Anthropic, DefaultHttpxClient
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional accelerator for spending aggregation; without it a plain Python loop is used
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
 # Load environment variables
 load_dotenv()
 
 # Model configuration - Claude Sonnet 4.5
 MODEL = "claude-sonnet-4-5-20250929"
 MAX_TOKENS = 4096
+# Cap for agents that reply with a small JSON object
+MAX_TOKENS_JSON = 256
 
-# Initialize the Claude client
+# Initialize the Claude client. It is shared across threads, so size the
+# connection pool to keep TLS connections alive between bursts of calls.
 client = Anthropic(
-    api_key=os.getenv("ANTHROPIC_API_KEY")
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    http_client=DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+    )
 )
 
 # Data storage paths
 DATA_DIR = "data"
-TRANSACTIONS_FILE = os.path.join(DATA_DIR, "transactions.json")
+TRANSACTIONS_FILE = os.path.join(DATA_DIR, "transactions.jsonl")  # one JSON object per line
+LEGACY_TRANSACTIONS_FILE = os.path.join(DATA_DIR, "transactions.json")
 USER_PROFILE_FILE = os.path.join(DATA_DIR, "user_profile.json")
 BUDGET_FILE = os.path.join(DATA_DIR, "budget.json")
 
 
+def _json_loads(data):
+    """Parse JSON from bytes or str, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj) -> bytes:
+    """Serialize obj to compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _sum_by_category(cat_ids, years, amounts, target_year, n_cats):
+        """Sum amounts per category id for rows in target_year"""
+        out = np.zeros(n_cats)
+        for i in range(len(amounts)):
+            if years[i] == target_year:
+                out[cat_ids[i]] += amounts[i]
+        return out
+
+
+class _TransactionColumns:
+    """Columnar (structure-of-arrays) copy of the transaction list for the Numba kernel"""
+    
+    def __init__(self):
+        self.source = None  # list the columns mirror
+        self.size = 0
+        self.category_ids: Dict[str, int] = {}
+        self.cat_ids = np.empty(1024, dtype=np.int32)
+        self.years = np.empty(1024, dtype=np.int32)
+        self.amounts = np.empty(1024, dtype=np.float64)
+    
+    def sync(self, transactions: List[Dict]):
+        """Catch up with transactions, rebuilding if it is a different list"""
+        if transactions is not self.source or len(transactions) < self.size:
+            self.source = transactions
+            self.size = 0
+            self.category_ids = {}
+        for t in transactions[self.size:]:
+            self._append(t)
+    
+    def _append(self, t: Dict):
+        if self.size == len(self.amounts):
+            # Grow by doubling so appends stay amortized O(1)
+            capacity = 2 * len(self.amounts)
+            self.cat_ids = np.resize(self.cat_ids, capacity)
+            self.years = np.resize(self.years, capacity)
+            self.amounts = np.resize(self.amounts, capacity)
+        cat_id = self.category_ids.setdefault(t['category'], len(self.category_ids))
+        self.cat_ids[self.size] = cat_id
+        self.years[self.size] = int(t['timestamp'][:4])
+        self.amounts[self.size] = t['amount']
+        self.size += 1
+
+
 class DataStore:
     """Simple JSON-based data storage for MVP"""
     
+    # Columnar view of the transactions, only used when Numba is installed
+    _columns: Optional[_TransactionColumns] = None
+    _columns_lock = threading.Lock()
+    
+    # Parsed file contents keyed by path: {path: (mtime_ns, data)}.
+    # An entry is reused until the file's mtime changes on disk.
+    _cache: Dict[str, Tuple[int, object]] = {}
+    
+    # Set once the data directory is known to exist
+    _dir_ready = False
+    
+    # Serializes writes between request threads (a gevent lock once monkey-patched)
+    _write_lock = threading.RLock()
+    
     @staticmethod
     def ensure_data_dir():
         """Create data directory if it doesn't exist"""
-        if not os.path.exists(DATA_DIR):
-            os.makedirs(DATA_DIR)
+        if DataStore._dir_ready:
+            return
+        os.makedirs(DATA_DIR, exist_ok=True)
+        DataStore._dir_ready = True
     
     @staticmethod
-    def load_transactions() -> List[Dict]:
-        """Load all transactions"""
+    def _read_cached(path: str, jsonl: bool = False):
+        """Return parsed JSON (or JSON Lines) for path, re-reading only when its mtime changed"""
+        mtime = os.stat(path).st_mtime_ns
+        cached = DataStore._cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            if jsonl:
+                data = [_json_loads(line) for line in f if line.strip()]
+            else:
+                data = _json_loads(f.read())
+        DataStore._cache[path] = (mtime, data)
+        return data
+    
+    @staticmethod
+    def _write_cached(path: str, data, jsonl: bool = False):
+        """Write data as JSON (or one JSON object per line) to path and refresh its cache entry"""
         DataStore.ensure_data_dir()
-        if os.path.exists(TRANSACTIONS_FILE):
-            with open(TRANSACTIONS_FILE, 'r') as f:
-                return json.load(f)
-        return []
+        with DataStore._write_lock:
+            with open(path, 'wb') as f:
+                if jsonl:
+                    f.writelines(_json_dumps(record) + b"\n" for record in data)
+                else:
+                    f.write(_json_dumps(data))
+            DataStore._cache[path] = (os.stat(path).st_mtime_ns, data)
+    
+    @staticmethod
+    def load_transactions() -> List[Dict]:
+        """Load all transactions (cached; treat the result as read-only)"""
+        try:
+            return DataStore._read_cached(TRANSACTIONS_FILE, jsonl=True)
+        except FileNotFoundError:
+            return []
+    
+    @staticmethod
+    def history_version() -> Tuple[int, int]:
+        """(mtime, row count) of the transaction log; changes whenever a transaction is recorded"""
+        try:
+            mtime = os.stat(TRANSACTIONS_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return (0, 0)
+        return (mtime, len(DataStore.load_transactions()))
     
     @staticmethod
     def save_transaction(transaction: Dict):
-        """Save a new transaction"""
-        transactions = DataStore.load_transactions()
-        transactions.append(transaction)
+        """Append a new transaction"""
+        # Categories are stored lowercased so scans can compare them directly
+        transaction = {**transaction, "category": transaction["category"].lower()}
         DataStore.ensure_data_dir()
-        with open(TRANSACTIONS_FILE, 'w') as f:
-            json.dump(transactions, f, indent=2)
+        with DataStore._write_lock:
+            cached = DataStore._cache.get(TRANSACTIONS_FILE)
+            try:
+                fresh = cached is not None and cached[0] == os.stat(TRANSACTIONS_FILE).st_mtime_ns
+            except FileNotFoundError:
+                fresh = False
+            with open(TRANSACTIONS_FILE, 'ab') as f:
+                f.write(_json_dumps(transaction) + b"\n")
+            if fresh:
+                # The cache already mirrors the file, so extend it instead of re-reading
+                cached[1].append(transaction)
+                DataStore._cache[TRANSACTIONS_FILE] = (os.stat(TRANSACTIONS_FILE).st_mtime_ns, cached[1])
+            else:
+                DataStore._cache.pop(TRANSACTIONS_FILE, None)
     
     @staticmethod
     def load_user_profile() -> Dict:
         """Load user financial profile"""
-        DataStore.ensure_data_dir()
-        if os.path.exists(USER_PROFILE_FILE):
-            with open(USER_PROFILE_FILE, 'r') as f:
-                return json.load(f)
-        # Default profile
-        return {
-            "monthly_income": 5000,
-            "current_savings": 10000,
-            "monthly_expenses": 3000,
-            "target_retirement_age": 65,
-            "current_age": 30,
-            "target_retirement_savings": 1000000
-        }
+        try:
+            return DataStore._read_cached(USER_PROFILE_FILE)
+        except FileNotFoundError:
+            # Default profile
+            return {
+                "monthly_income": 5000,
+                "current_savings": 10000,
+                "monthly_expenses": 3000,
+                "target_retirement_age": 65,
+                "current_age": 30,
+                "target_retirement_savings": 1000000
+            }
     
     @staticmethod
     def save_user_profile(profile: Dict):
         """Save user profile"""
-        DataStore.ensure_data_dir()
-        with open(USER_PROFILE_FILE, 'w') as f:
-            json.dump(profile, f, indent=2)
+        with DataStore._write_lock:
+            DataStore._write_cached(USER_PROFILE_FILE, profile)
+            _long_term_status.cache_clear()
     
     @staticmethod
     def load_budget() -> Dict:
         """Load category budgets"""
-        DataStore.ensure_data_dir()
-        if os.path.exists(BUDGET_FILE):
-            with open(BUDGET_FILE, 'r') as f:
-                return json.load(f)
-        # Default budgets
-        return {
-            "food": 500,
-            "transportation": 300,
-            "entertainment": 200,
-            "shopping": 400,
-            "bills": 800,
-            "other": 300
-        }
+        try:
+            return DataStore._read_cached(BUDGET_FILE)
+        except FileNotFoundError:
+            # Default budgets
+            return {
+                "food": 500,
+                "transportation": 300,
+                "entertainment": 200,
+                "shopping": 400,
+                "bills": 800,
+                "other": 300
+            }
     
     @staticmethod
     def get_category_spending(category: str, year: int = None) -> float:
@@ -98,16 +243,51 @@ class DataStore:
         if year is None:
             year = datetime.now().year
         transactions = DataStore.load_transactions()
+        # ISO-8601 timestamps start with the year, so a slice avoids parsing
+        cat_lower = category.lower()
+        year_str = str(year)
         total = 0
         for t in transactions:
-            t_date = datetime.fromisoformat(t['timestamp'])
-            if t['category'].lower() == category.lower() and t_date.year == year:
+            if t['category'] == cat_lower and t['timestamp'][:4] == year_str:
                 total += t['amount']
         return total
     
+    @staticmethod
+    def get_all_category_spending(year: int = None) -> Dict[str, float]:
+        """Get total spending per (lowercased) category in a given year, in one pass"""
+        if year is None:
+            year = datetime.now().year
+        transactions = DataStore.load_transactions()
+        
+        if njit is not None:
+            with DataStore._columns_lock:
+                if DataStore._columns is None:
+                    DataStore._columns = _TransactionColumns()
+                cols = DataStore._columns
+                cols.sync(transactions)
+                n = cols.size
+                sums = _sum_by_category(
+                    cols.cat_ids[:n], cols.years[:n], cols.amounts[:n], year, len(cols.category_ids)
+                )
+                return {category: float(sums[cat_id]) for category, cat_id in cols.category_ids.items()}
+        
+        year_str = str(year)
+        totals = defaultdict(float)
+        for t in transactions:
+            if t['timestamp'][:4] == year_str:
+                totals[t['category']] += t['amount']
+        return dict(totals)
+    
     @staticmethod
     def initialize_sample_data():
         """Initialize sample transaction data for testing"""
+        # Convert transactions stored by older versions as a single JSON array
+        if not os.path.exists(TRANSACTIONS_FILE) and os.path.exists(LEGACY_TRANSACTIONS_FILE):
+            with open(LEGACY_TRANSACTIONS_FILE, 'rb') as f:
+                legacy = _json_loads(f.read())
+            legacy = [{**t, "category": t["category"].lower()} for t in legacy]
+            DataStore._write_cached(TRANSACTIONS_FILE, legacy, jsonl=True)
+        
         transactions = DataStore.load_transactions()
         
         # Only initialize if no transactions exist
@@ -121,9 +301,168 @@ class DataStore:
                 {"amount": 80.00, "category": "transportation", "timestamp": (datetime.now() - timedelta(days=5)).isoformat()},
             ]
             
-            DataStore.ensure_data_dir()
-            with open(TRANSACTIONS_FILE, 'w') as f:
-                json.dump(sample_transactions, f, indent=2)
+            DataStore._write_cached(TRANSACTIONS_FILE, sample_transactions, jsonl=True)
+
+
+def _extract_json(text: str) -> Optional[Dict]:
+    """Parse the first balanced JSON object in text, or return None if there is none"""
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return json.loads(text[start:i + 1])
+    return None
+
+
+# Prompt templates. The *_INSTRUCTIONS constants are the static prompt prefixes
+# (sent with cache_control so Anthropic can reuse them); the *_DATA_TPL templates
+# are filled in with str.format_map for each call.
+LONGEVITY_INSTRUCTIONS = """Provide a concise analysis (2-3 sentences) evaluating:
+1. Whether the user is on track for retirement
+2. How this transaction impacts their long-term goals
+3. A status: "OK", "BORDERLINE", or "RISKY"
+"""
+
+LONGEVITY_DATA_TPL = """User Profile:
+- Monthly Income: ${monthly_income:,.2f}
+- Current Savings: ${current_savings:,.2f}
+- Monthly Expenses: ${monthly_expenses:,.2f}
+- Current Age: {current_age}
+- Target Retirement Age: {target_age}
+- Target Retirement Savings: ${target_savings:,.2f}
+
+Calculations:
+- Current Savings Rate: {savings_rate:.1%}
+- Years to Retirement: {years_to_retirement}
+- Projected Savings at Retirement: ${projected_savings:,.2f}
+- Required Monthly Savings: ${required_monthly_savings:,.2f}
+- Required Savings Rate: {required_savings_rate:.1%}
+
+Current Transaction:
+- Amount: ${amount:,.2f}
+- Category: {category}
+"""
+
+BUDGET_INSTRUCTIONS = """Provide a concise analysis (2-3 sentences) evaluating:
+1. Whether this purchase fits within the budget
+2. How it impacts the annual spending plan
+3. A status: "OK", "BORDERLINE", or "RISKY"
+"""
+
+BUDGET_DATA_TPL = """Category: {category}
+Annual Budget: ${annual_budget:,.2f}
+Spent This Year (before this transaction): ${year_spending:,.2f}
+Current Transaction: ${amount:,.2f}
+Projected Annual Spending: ${projected_spending:,.2f}
+Remaining Budget: ${remaining_budget:,.2f}
+Percentage of Budget Used: {percentage_used:.1f}%
+"""
+
+ANOMALY_INSTRUCTIONS = """Provide a concise analysis (2-3 sentences) evaluating:
+1. Whether this is an unusual purchase
+2. If it's unusually large for this category
+3. A status: "OK", "BORDERLINE", or "RISKY"
+"""
+
+ANOMALY_DATA_TPL = """Transaction:
+- Amount: ${amount:,.2f}
+- Category: {category}
+
+Historical Context:
+- Average Transaction: ${avg_amount:,.2f}
+- Max Transaction: ${max_amount:,.2f}
+- Category Average: ${category_avg:,.2f}
+- Category Max: ${category_max:,.2f}
+
+This transaction is:
+- {avg_ratio:.1f}x the category average
+- {max_ratio:.1f}x the category maximum
+"""
+
+DECISION_INSTRUCTIONS = """You are a Decision Agent providing final purchase guidance.
+
+Provide a natural, friendly explanation (2-3 sentences) that:
+1. Summarizes the key factors
+2. Explains why the purchase received its decision:
+   - GREEN: Purchase is healthy and within budget
+   - WHITE: Purchase is acceptable but could be optimized (may be too small or slightly over)
+   - RED: Purchase exceeds budget or poses financial risk
+3. Mentions the auto-investment amount
+
+Be conversational and helpful, not judgmental.
+"""
+
+DECISION_DATA_TPL = """Agent Analysis:
+- Longevity Agent: {longevity_status} - {longevity_analysis}
+- Budget Agent: {budget_status} - {budget_analysis}
+- Anomaly Agent: {anomaly_status} - {anomaly_analysis}
+
+Overall Score: {overall_score:.2f}
+Decision: {color}
+
+Transaction Amount: ${amount:,.2f}
+Auto-Investment Amount: ${auto_invest:,.2f}
+"""
+
+# Phrases for the templated decision explanation, keyed by color / agent status
+DECISION_COLOR_SUMMARIES = {
+    "GREEN": "This purchase looks healthy and fits your plan.",
+    "WHITE": "This purchase is acceptable but could be optimized.",
+    "RED": "This purchase poses a risk to your finances."
+}
+LONGEVITY_STATUS_PHRASES = {
+    "OK": "a healthy long-term outlook",
+    "BORDERLINE": "a long-term outlook that needs attention",
+    "RISKY": "a risky long-term outlook"
+}
+BUDGET_STATUS_PHRASES = {
+    "OK": "comfortable room in your budget",
+    "BORDERLINE": "a category budget that is getting tight",
+    "RISKY": "spending beyond your category budget"
+}
+ANOMALY_STATUS_PHRASES = {
+    "OK": "a typical amount for this category",
+    "BORDERLINE": "a somewhat unusual amount for this category",
+    "RISKY": "an unusually large amount for this category"
+}
+
+# Shared JSON response format for single-agent prompts
+AGENT_RESPONSE_FORMAT = """Respond with ONLY a JSON object (no prose) in this format:
+{
+    "status": "OK|BORDERLINE|RISKY",
+    "analysis": "brief analysis text",
+    "score": 0.0-1.0
+}
+"""
+
+
+def _prompt_messages(static_prefix: str, dynamic_suffix: str) -> List[Dict]:
+    """Build a user message whose constant prefix is marked for Anthropic prompt caching"""
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": static_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": dynamic_suffix}
+        ]
+    }]
 
 
 class LongevityAgent:
@@ -131,9 +470,12 @@ class LongevityAgent:
     
     def __init__(self):
         self.name = "Longevity Agent"
+        self.role = "You are a Longevity Agent evaluating long-term financial health."
+        self.instructions = LONGEVITY_INSTRUCTIONS
+        self.static_prompt = f"{self.role}\n\n{self.instructions}\n{AGENT_RESPONSE_FORMAT}"
     
-    def analyze(self, user_profile: Dict, current_transaction: Dict) -> Dict:
-        """Analyze long-term financial health"""
+    def compute_metrics(self, user_profile: Dict, current_transaction: Dict) -> Dict:
+        """Compute the retirement projections used by the analysis"""
         monthly_income = user_profile.get('monthly_income', 5000)
         current_savings = user_profile.get('current_savings', 10000)
         monthly_expenses = user_profile.get('monthly_expenses', 3000)
@@ -156,55 +498,64 @@ class LongevityAgent:
         required_monthly_savings = required_savings / (years_to_retirement * 12) if years_to_retirement > 0 else 0
         required_savings_rate = required_monthly_savings / monthly_income if monthly_income > 0 else 0
         
-        # Use Claude to generate analysis
-        prompt = f"""You are a Longevity Agent evaluating long-term financial health.
-
-User Profile:
-- Monthly Income: ${monthly_income:,.2f}
-- Current Savings: ${current_savings:,.2f}
-- Monthly Expenses: ${monthly_expenses:,.2f}
-- Current Age: {current_age}
-- Target Retirement Age: {target_age}
-- Target Retirement Savings: ${target_savings:,.2f}
-
-Calculations:
-- Current Savings Rate: {savings_rate:.1%}
-- Years to Retirement: {years_to_retirement}
-- Projected Savings at Retirement: ${projected_savings:,.2f}
-- Required Monthly Savings: ${required_monthly_savings:,.2f}
-- Required Savings Rate: {required_savings_rate:.1%}
-
-Current Transaction:
-- Amount: ${current_transaction['amount']:,.2f}
-- Category: {current_transaction['category']}
-
-Provide a concise analysis (2-3 sentences) evaluating:
-1. Whether the user is on track for retirement
-2. How this transaction impacts their long-term goals
-3. A status: "OK", "BORDERLINE", or "RISKY"
-
-Format your response as JSON:
-{{
-    "status": "OK|BORDERLINE|RISKY",
-    "analysis": "brief analysis text",
-    "score": 0.0-1.0
-}}
-"""
+        return {
+            "monthly_income": monthly_income,
+            "current_savings": current_savings,
+            "monthly_expenses": monthly_expenses,
+            "current_age": current_age,
+            "target_age": target_age,
+            "target_savings": target_savings,
+            "savings_rate": savings_rate,
+            "years_to_retirement": years_to_retirement,
+            "projected_savings": projected_savings,
+            "required_monthly_savings": required_monthly_savings,
+            "required_savings_rate": required_savings_rate,
+            "amount": current_transaction['amount'],
+            "category": current_transaction['category']
+        }
+    
+    def task_prompt(self, m: Dict) -> str:
+        """Format the longevity task data for the given metrics"""
+        return LONGEVITY_DATA_TPL.format_map(m)
+    
+    def clearly_ok(self, m: Dict) -> bool:
+        """Whether the metrics alone settle an OK status, so Claude can be skipped"""
+        # Savings rate comfortably above a non-negative required rate; a negative
+        # required rate makes the fallback's ratios meaningless, so ask Claude
+        return m['required_savings_rate'] >= 0 and m['savings_rate'] >= m['required_savings_rate'] * 1.2
+    
+    def fallback(self, m: Dict) -> Dict:
+        """Rule-based result computed from the metrics alone"""
+        savings_rate = m['savings_rate']
+        required_savings_rate = m['required_savings_rate']
+        status = "OK" if savings_rate >= required_savings_rate * 0.9 else "BORDERLINE" if savings_rate >= required_savings_rate * 0.7 else "RISKY"
+        return {
+            "status": status,
+            "analysis": f"Current savings rate {savings_rate:.1%} vs required {required_savings_rate:.1%}",
+            "score": min(1.0, savings_rate / required_savings_rate) if required_savings_rate > 0 else 0.5
+        }
+    
+    def analyze(self, user_profile: Dict, current_transaction: Dict) -> Dict:
+        """Analyze long-term financial health"""
+        m = self.compute_metrics(user_profile, current_transaction)
+        if self.clearly_ok(m):
+            return self.fallback(m)
+        
+        savings_rate = m['savings_rate']
+        required_savings_rate = m['required_savings_rate']
         
+        # Use Claude to generate analysis
         try:
             message = client.messages.create(
                 model=MODEL,
-                max_tokens=MAX_TOKENS,
-                messages=[{"role": "user", "content": prompt}]
+                max_tokens=MAX_TOKENS_JSON,
+                messages=_prompt_messages(self.static_prompt, self.task_prompt(m))
             )
             response_text = message.content[0].text
             
             # Try to parse JSON from response
-            import re
-            json_match = re.search(r'\{[^}]+\}', response_text, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
-            else:
+            result = _extract_json(response_text)
+            if result is None:
                 # Fallback
                 result = {
                     "status": "BORDERLINE" if savings_rate < required_savings_rate else "OK",
@@ -215,12 +566,7 @@ Format your response as JSON:
             return result
         except Exception as e:
             # Fallback calculation
-            status = "OK" if savings_rate >= required_savings_rate * 0.9 else "BORDERLINE" if savings_rate >= required_savings_rate * 0.7 else "RISKY"
-            return {
-                "status": status,
-                "analysis": f"Current savings rate {savings_rate:.1%} vs required {required_savings_rate:.1%}",
-                "score": min(1.0, savings_rate / required_savings_rate) if required_savings_rate > 0 else 0.5
-            }
+            return self.fallback(m)
 
 
 class BudgetAgent:
@@ -228,9 +574,11 @@ class BudgetAgent:
     
     def __init__(self):
         self.name = "Budget Agent"
+        self.role = "You are a Budget Agent checking category spending limits."
+        self.instructions = BUDGET_INSTRUCTIONS
     
-    def analyze(self, category: str, amount: float) -> Dict:
-        """Analyze budget status for category"""
+    def compute_metrics(self, category: str, amount: float) -> Dict:
+        """Compute annual budget usage for the category"""
         budget = DataStore.load_budget()
         category_budget = budget.get(category.lower(), budget.get('other', 300))
         
@@ -246,73 +594,40 @@ class BudgetAgent:
         annual_budget = category_budget * 12
         percentage_used = (projected_spending / annual_budget * 100) if annual_budget > 0 else 0
         
-        # Use Claude to generate analysis
-        prompt = f"""You are a Budget Agent checking category spending limits.
-
-Category: {category}
-Annual Budget: ${annual_budget:,.2f}
-Spent This Year (before this transaction): ${year_spending:,.2f}
-Current Transaction: ${amount:,.2f}
-Projected Annual Spending: ${projected_spending:,.2f}
-Remaining Budget: ${remaining_budget:,.2f}
-Percentage of Budget Used: {percentage_used:.1f}%
-
-Provide a concise analysis (2-3 sentences) evaluating:
-1. Whether this purchase fits within the budget
-2. How it impacts the annual spending plan
-3. A status: "OK", "BORDERLINE", or "RISKY"
-
-Format your response as JSON:
-{{
-    "status": "OK|BORDERLINE|RISKY",
-    "analysis": "brief analysis text",
-    "score": 0.0-1.0
-}}
-"""
+        return {
+            "category": category,
+            "amount": amount,
+            "annual_budget": annual_budget,
+            "year_spending": year_spending,
+            "projected_spending": projected_spending,
+            "remaining_budget": remaining_budget,
+            "percentage_used": percentage_used
+        }
+    
+    def task_prompt(self, m: Dict) -> str:
+        """Format the budget task data for the given metrics"""
+        return BUDGET_DATA_TPL.format_map(m)
+    
+    def clearly_ok(self, m: Dict) -> bool:
+        """Whether the metrics alone settle an OK status, so Claude can be skipped"""
+        # Less than half of the annual budget used
+        return m['percentage_used'] < 50
+    
+    def fallback(self, m: Dict) -> Dict:
+        """Rule-based result computed from the metrics alone"""
+        percentage_used = m['percentage_used']
+        if percentage_used <= 80:
+            status = "OK"
+        elif percentage_used <= 100:
+            status = "BORDERLINE"
+        else:
+            status = "RISKY"
         
-        try:
-            message = client.messages.create(
-                model=MODEL,
-                max_tokens=MAX_TOKENS,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            response_text = message.content[0].text
-            
-            # Try to parse JSON from response
-            import re
-            json_match = re.search(r'\{[^}]+\}', response_text, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
-            else:
-                # Fallback
-                if percentage_used <= 80:
-                    status = "OK"
-                elif percentage_used <= 100:
-                    status = "BORDERLINE"
-                else:
-                    status = "RISKY"
-                
-                result = {
-                    "status": status,
-                    "analysis": f"Using {percentage_used:.1f}% of annual {category} budget",
-                    "score": max(0, 1.0 - (percentage_used / 100))
-                }
-            
-            return result
-        except Exception as e:
-            # Fallback calculation
-            if percentage_used <= 80:
-                status = "OK"
-            elif percentage_used <= 100:
-                status = "BORDERLINE"
-            else:
-                status = "RISKY"
-            
-            return {
-                "status": status,
-                "analysis": f"Using {percentage_used:.1f}% of annual {category} budget",
-                "score": max(0, 1.0 - (percentage_used / 100))
-            }
+        return {
+            "status": status,
+            "analysis": f"Using {percentage_used:.1f}% of annual {m['category']} budget",
+            "score": max(0, 1.0 - (percentage_used / 100))
+        }
 
 
 class AnomalyAgent:
@@ -320,23 +635,36 @@ class AnomalyAgent:
     
     def __init__(self):
         self.name = "Anomaly Agent"
+        self.role = "You are an Anomaly Agent detecting unusual purchases."
+        self.instructions = ANOMALY_INSTRUCTIONS
     
-    def analyze(self, category: str, amount: float) -> Dict:
-        """Detect anomalies in purchase"""
+    def compute_metrics(self, category: str, amount: float) -> Dict:
+        """Compare the purchase against historical transaction statistics"""
         transactions = DataStore.load_transactions()
         
-        # Calculate statistics
+        # Calculate overall and category-specific statistics in one pass
         if transactions:
-            amounts = [t['amount'] for t in transactions]
-            avg_amount = sum(amounts) / len(amounts)
-            max_amount = max(amounts)
+            cat_lower = category.lower()
+            total = 0
+            max_amount = float('-inf')
+            cat_total = 0
+            cat_count = 0
+            cat_max = float('-inf')
+            for t in transactions:
+                t_amount = t['amount']
+                total += t_amount
+                if t_amount > max_amount:
+                    max_amount = t_amount
+                if t['category'] == cat_lower:
+                    cat_total += t_amount
+                    cat_count += 1
+                    if t_amount > cat_max:
+                        cat_max = t_amount
+            avg_amount = total / len(transactions)
             
-            # Category-specific stats
-            category_transactions = [t for t in transactions if t['category'].lower() == category.lower()]
-            if category_transactions:
-                category_amounts = [t['amount'] for t in category_transactions]
-                category_avg = sum(category_amounts) / len(category_amounts)
-                category_max = max(category_amounts)
+            if cat_count:
+                category_avg = cat_total / cat_count
+                category_max = cat_max
             else:
                 category_avg = avg_amount
                 category_max = max_amount
@@ -346,94 +674,129 @@ class AnomalyAgent:
             category_avg = amount
             category_max = amount
         
-        # Calculate anomaly score
-        is_large = amount > category_avg * 3
-        is_very_large = amount > category_max * 1.5
+        # A zero average or max (e.g. only $0.00 purchases so far) gives nothing to compare against
+        avg_ratio = amount / category_avg if category_avg > 0 else 1.0
+        max_ratio = amount / category_max if category_max > 0 else 1.0
         
-        # Use Claude to generate analysis
-        prompt = f"""You are an Anomaly Agent detecting unusual purchases.
-
-Transaction:
-- Amount: ${amount:,.2f}
-- Category: {category}
-
-Historical Context:
-- Average Transaction: ${avg_amount:,.2f}
-- Max Transaction: ${max_amount:,.2f}
-- Category Average: ${category_avg:,.2f}
-- Category Max: ${category_max:,.2f}
-
-This transaction is:
-- {amount / category_avg:.1f}x the category average
-- {amount / category_max:.1f}x the category maximum
+        return {
+            "category": category,
+            "amount": amount,
+            "avg_amount": avg_amount,
+            "max_amount": max_amount,
+            "category_avg": category_avg,
+            "category_max": category_max,
+            "avg_ratio": avg_ratio,
+            "max_ratio": max_ratio,
+            # Calculate anomaly score
+            "is_large": avg_ratio > 3,
+            "is_very_large": max_ratio > 1.5
+        }
+    
+    def task_prompt(self, m: Dict) -> str:
+        """Format the anomaly task data for the given metrics"""
+        return ANOMALY_DATA_TPL.format_map(m)
+    
+    def clearly_ok(self, m: Dict) -> bool:
+        """Whether the metrics alone settle an OK status, so Claude can be skipped"""
+        # Neither large against the category average nor very large against its max
+        return not m['is_large'] and not m['is_very_large']
+    
+    def fallback(self, m: Dict) -> Dict:
+        """Rule-based result computed from the metrics alone"""
+        is_large = m['is_large']
+        is_very_large = m['is_very_large']
+        if is_very_large:
+            status = "RISKY"
+        elif is_large:
+            status = "BORDERLINE"
+        else:
+            status = "OK"
+        
+        return {
+            "status": status,
+            "analysis": f"This is {m['avg_ratio']:.1f}x your average {m['category']} purchase",
+            "score": 1.0 if not is_large else (0.5 if not is_very_large else 0.2)
+        }
 
-Provide a concise analysis (2-3 sentences) evaluating:
-1. Whether this is an unusual purchase
-2. If it's unusually large for this category
-3. A status: "OK", "BORDERLINE", or "RISKY"
 
-Format your response as JSON:
-{{
-    "status": "OK|BORDERLINE|RISKY",
-    "analysis": "brief analysis text",
-    "score": 0.0-1.0
-}}
-"""
+class CombinedAnalysisAgent:
+    """Runs the Longevity, Budget and Anomaly analyses in a single Claude call"""
+    
+    def __init__(self, longevity_agent: LongevityAgent, budget_agent: BudgetAgent, anomaly_agent: AnomalyAgent):
+        self.name = "Combined Analysis Agent"
+        self.agents = {
+            "longevity": longevity_agent,
+            "budget": budget_agent,
+            "anomaly": anomaly_agent
+        }
+        task_instructions = "\n".join(
+            f"{key.title()} task\n{agent.role}\n\n{agent.instructions}" for key, agent in self.agents.items()
+        )
+        self.static_prompt = (
+            "You are a team of financial analysis agents reviewing a single purchase. "
+            "The data for each task you must complete follows these instructions.\n\n"
+            + task_instructions
+            + "\nRespond with ONLY a JSON object (no prose, no code fences) with one key per task you are given "
+            + "(\"longevity\", \"budget\" and/or \"anomaly\"), each shaped like:\n"
+            + '{"status": "OK|BORDERLINE|RISKY", "analysis": "brief analysis text", "score": 0.0-1.0}\n'
+        )
+    
+    def analyze(self, user_profile: Dict, transaction: Dict) -> Dict[str, Dict]:
+        """Analyze a purchase, returning results keyed by longevity/budget/anomaly"""
+        category = transaction['category']
+        amount = transaction['amount']
+        
+        # Numeric precomputation stays in Python; Claude only writes the analysis
+        metrics = {
+            "longevity": self.agents["longevity"].compute_metrics(user_profile, transaction),
+            "budget": self.agents["budget"].compute_metrics(category, amount),
+            "anomaly": self.agents["anomaly"].compute_metrics(category, amount)
+        }
+        
+        # Clear-cut tasks are settled locally; only ambiguous ones go to Claude
+        results = {}
+        pending = []
+        for key, agent in self.agents.items():
+            if agent.clearly_ok(metrics[key]):
+                results[key] = agent.fallback(metrics[key])
+            else:
+                pending.append(key)
+        if not pending:
+            return results
+        
+        sections = [f"Tasks to complete: {', '.join(pending)}\n"]
+        for n, key in enumerate(pending, 1):
+            sections.append(f"Task {n}: {key.title()}\n{self.agents[key].task_prompt(metrics[key])}")
         
         try:
             message = client.messages.create(
                 model=MODEL,
-                max_tokens=MAX_TOKENS,
-                messages=[{"role": "user", "content": prompt}]
+                max_tokens=MAX_TOKENS_JSON * len(pending),
+                messages=_prompt_messages(self.static_prompt, "\n".join(sections))
             )
-            response_text = message.content[0].text
-            
-            # Try to parse JSON from response
-            import re
-            json_match = re.search(r'\{[^}]+\}', response_text, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
-            else:
-                # Fallback
-                if is_very_large:
-                    status = "RISKY"
-                elif is_large:
-                    status = "BORDERLINE"
-                else:
-                    status = "OK"
-                
-                result = {
-                    "status": status,
-                    "analysis": f"This is {amount / category_avg:.1f}x your average {category} purchase",
-                    "score": 1.0 if not is_large else (0.5 if not is_very_large else 0.2)
-                }
-            
-            return result
+            parsed = _extract_json(message.content[0].text)
         except Exception as e:
-            # Fallback calculation
-            if is_very_large:
-                status = "RISKY"
-            elif is_large:
-                status = "BORDERLINE"
-            else:
-                status = "OK"
-            
-            return {
-                "status": status,
-                "analysis": f"This is {amount / category_avg:.1f}x your average {category} purchase",
-                "score": 1.0 if not is_large else (0.5 if not is_very_large else 0.2)
-            }
+            parsed = {}
+        
+        # Fall back per task so one malformed entry doesn't discard the others
+        for key in pending:
+            result = parsed.get(key) if isinstance(parsed, dict) else None
+            if not isinstance(result, dict) or 'status' not in result:
+                result = self.agents[key].fallback(metrics[key])
+            results[key] = result
+        return results
 
 
 class DecisionAgent:
     """Aggregates all signals into Green/Red/White + explanation"""
     
-    def __init__(self):
+    def __init__(self, explain_with_llm: bool = False):
         self.name = "Decision Agent"
+        # Templated explanations avoid a Claude round-trip; set to True for LLM prose
+        self.explain_with_llm = explain_with_llm
     
-    def aggregate(self, longevity_result: Dict, budget_result: Dict, anomaly_result: Dict, amount: float) -> Dict:
-        """Aggregate all agent signals into final decision"""
-        
+    def _score(self, longevity_result: Dict, budget_result: Dict, anomaly_result: Dict, amount: float) -> Tuple[float, str, float]:
+        """Compute the weighted score, color and auto-investment amount"""
         # Calculate weighted score
         weights = {
             "longevity": 0.4,
@@ -467,41 +830,42 @@ class DecisionAgent:
             round_up = max(1, round(amount) - amount)
             auto_invest = round_up + (amount * 0.10)
         
-        # Use Claude to generate explanation
-        prompt = f"""You are a Decision Agent providing final purchase guidance.
-
-Agent Analysis:
-- Longevity Agent: {longevity_result.get('status')} - {longevity_result.get('analysis', '')}
-- Budget Agent: {budget_result.get('status')} - {budget_result.get('analysis', '')}
-- Anomaly Agent: {anomaly_result.get('status')} - {anomaly_result.get('analysis', '')}
-
-Overall Score: {overall_score:.2f}
-Decision: {color}
-
-Transaction Amount: ${amount:,.2f}
-Auto-Investment Amount: ${auto_invest:,.2f}
-
-Provide a natural, friendly explanation (2-3 sentences) that:
-1. Summarizes the key factors
-2. Explains why this is {color}:
-   - GREEN: Purchase is healthy and within budget
-   - WHITE: Purchase is acceptable but could be optimized (may be too small or slightly over)
-   - RED: Purchase exceeds budget or poses financial risk
-3. Mentions the auto-investment amount
-
-Be conversational and helpful, not judgmental.
-"""
-        
-        try:
-            message = client.messages.create(
-                model=MODEL,
-                max_tokens=MAX_TOKENS,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            explanation = message.content[0].text
-        except Exception as e:
-            explanation = f"Based on your financial profile, this purchase is {color}. Auto-invest ${auto_invest:,.2f}."
+        return overall_score, color, auto_invest
+    
+    def _explanation_prompt(self, longevity_result: Dict, budget_result: Dict, anomaly_result: Dict,
+                            amount: float, overall_score: float, color: str, auto_invest: float) -> str:
+        """Format the decision data Claude is asked to explain"""
+        return DECISION_DATA_TPL.format_map({
+            "longevity_status": longevity_result.get('status'),
+            "longevity_analysis": longevity_result.get('analysis', ''),
+            "budget_status": budget_result.get('status'),
+            "budget_analysis": budget_result.get('analysis', ''),
+            "anomaly_status": anomaly_result.get('status'),
+            "anomaly_analysis": anomaly_result.get('analysis', ''),
+            "overall_score": overall_score,
+            "color": color,
+            "amount": amount,
+            "auto_invest": auto_invest
+        })
+    
+    def _template_explanation(self, longevity_result: Dict, budget_result: Dict, anomaly_result: Dict,
+                              color: str, auto_invest: float) -> str:
+        """Explain the decision from the agent statuses without calling Claude"""
+        def phrase(phrases: Dict[str, str], result: Dict, subject: str) -> str:
+            status = str(result.get('status', 'BORDERLINE')).upper()
+            return phrases.get(status, f"a {status.lower()} {subject}")
         
+        return (
+            f"{DECISION_COLOR_SUMMARIES[color]} "
+            f"Your {color} rating reflects {phrase(LONGEVITY_STATUS_PHRASES, longevity_result, 'long-term outlook')}, "
+            f"{phrase(BUDGET_STATUS_PHRASES, budget_result, 'budget position')}, and "
+            f"{phrase(ANOMALY_STATUS_PHRASES, anomaly_result, 'purchase size')}. "
+            f"We'll auto-invest ${auto_invest:,.2f}."
+        )
+    
+    def _decision(self, longevity_result: Dict, budget_result: Dict, anomaly_result: Dict,
+                  overall_score: float, color: str, auto_invest: float, explanation: str) -> Dict:
+        """Assemble the final decision dict"""
         return {
             "color": color,
             "explanation": explanation,
@@ -513,21 +877,123 @@ Be conversational and helpful, not judgmental.
                 "anomaly": anomaly_result
             }
         }
+    
+    def aggregate(self, longevity_result: Dict, budget_result: Dict, anomaly_result: Dict, amount: float) -> Dict:
+        """Aggregate all agent signals into final decision"""
+        overall_score, color, auto_invest = self._score(longevity_result, budget_result, anomaly_result, amount)
+        explanation = self._template_explanation(longevity_result, budget_result, anomaly_result, color, auto_invest)
+        if not self.explain_with_llm:
+            return self._decision(
+                longevity_result, budget_result, anomaly_result, overall_score, color, auto_invest, explanation
+            )
+        
+        # Use Claude to generate explanation
+        prompt = self._explanation_prompt(
+            longevity_result, budget_result, anomaly_result, amount, overall_score, color, auto_invest
+        )
+        
+        try:
+            message = client.messages.create(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                messages=_prompt_messages(DECISION_INSTRUCTIONS, prompt)
+            )
+            explanation = message.content[0].text
+        except Exception as e:
+            # Keep the templated explanation
+            pass
+        
+        return self._decision(
+            longevity_result, budget_result, anomaly_result, overall_score, color, auto_invest, explanation
+        )
+    
+    def aggregate_stream(self, longevity_result: Dict, budget_result: Dict, anomaly_result: Dict,
+                         amount: float) -> Generator[str, None, Dict]:
+        """Like aggregate, but yield explanation text chunks as Claude produces them.
+        
+        The generator's return value (``result = yield from ...``) is the full decision dict.
+        """
+        overall_score, color, auto_invest = self._score(longevity_result, budget_result, anomaly_result, amount)
+        templated = self._template_explanation(longevity_result, budget_result, anomaly_result, color, auto_invest)
+        if not self.explain_with_llm:
+            yield templated
+            return self._decision(
+                longevity_result, budget_result, anomaly_result, overall_score, color, auto_invest, templated
+            )
+        
+        prompt = self._explanation_prompt(
+            longevity_result, budget_result, anomaly_result, amount, overall_score, color, auto_invest
+        )
+        
+        chunks = []
+        try:
+            with client.messages.stream(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                messages=_prompt_messages(DECISION_INSTRUCTIONS, prompt)
+            ) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            # Only substitute the templated text if nothing was streamed yet
+            if not chunks:
+                chunks.append(templated)
+                yield templated
+        
+        return self._decision(
+            longevity_result, budget_result, anomaly_result, overall_score, color, auto_invest, "".join(chunks)
+        )
+
+
+@lru_cache(maxsize=8)
+def _long_term_status(longevity_agent: LongevityAgent, profile_key: Tuple) -> str:
+    """Longevity status for a profile given as sorted (key, value) pairs"""
+    dummy_transaction = {"amount": 0, "category": "other"}
+    longevity_result = longevity_agent.analyze(dict(profile_key), dummy_transaction)
+    return longevity_result.get('status', 'BORDERLINE')
 
 
 class MultiAgentSystem:
     """Main multi-agent system orchestrator"""
     
-    def __init__(self):
+    def __init__(self, explain_with_llm: bool = False):
         self.longevity_agent = LongevityAgent()
         self.budget_agent = BudgetAgent()
         self.anomaly_agent = AnomalyAgent()
-        self.decision_agent = DecisionAgent()
+        self.combined_agent = CombinedAnalysisAgent(
+            self.longevity_agent, self.budget_agent, self.anomaly_agent
+        )
+        self.decision_agent = DecisionAgent(explain_with_llm=explain_with_llm)
         # Initialize sample data if needed
         DataStore.initialize_sample_data()
     
-    def analyze_purchase(self, amount: float, category: str, include_steps: bool = False) -> Dict:
-        """Analyze a purchase using all agents"""
+    def analyze_purchase(self, amount: float, category: str, include_steps: bool = False,
+                         record: bool = True) -> Dict:
+        """Analyze a purchase using all agents.
+        
+        With record=False the transaction is not saved; pass the result to record_purchase later.
+        """
+        steps = []
+        for message in self.analyze_purchase_stream(amount, category, record=record):
+            if "step" in message:
+                steps.append(message["step"])
+            elif "decision" in message:
+                result = message
+        
+        if include_steps:
+            result["steps"] = steps
+        
+        return result
+    
+    def analyze_purchase_stream(self, amount: float, category: str,
+                                record: bool = True) -> Generator[Dict, None, None]:
+        """Analyze a purchase, yielding {"step": ...} as each agent starts and finishes.
+        
+        With explain_with_llm, {"explanation": text} chunks are yielded as Claude writes the
+        decision explanation. The last item is {"transaction": ..., "decision": ...}, as
+        returned by analyze_purchase.
+        """
         
         # Create transaction object
         transaction = {
@@ -539,83 +1005,75 @@ class MultiAgentSystem:
         # Get user profile
         user_profile = DataStore.load_user_profile()
         
-        steps = [] if include_steps else None
-        
-        # Run all agents with step tracking
-        if include_steps:
-            steps.append({
-                "agent": "Longevity Agent",
+        # Sub-agents and the step descriptions shown while they run
+        sub_agents = [
+            ("longevity", self.longevity_agent, "Evaluating long-term financial health..."),
+            ("budget", self.budget_agent, "Checking category budget limits..."),
+            ("anomaly", self.anomaly_agent, "Detecting unusual purchase patterns...")
+        ]
+        for key, agent, description in sub_agents:
+            yield {"step": {
+                "agent": agent.name,
                 "status": "analyzing",
-                "description": "Evaluating long-term financial health..."
-            })
-        longevity_result = self.longevity_agent.analyze(user_profile, transaction)
-        if include_steps:
-            steps.append({
-                "agent": "Longevity Agent",
-                "status": "completed",
-                "result": longevity_result
-            })
+                "description": description
+            }}
         
-        if include_steps:
-            steps.append({
-                "agent": "Budget Agent",
-                "status": "analyzing",
-                "description": "Checking category budget limits..."
-            })
-        budget_result = self.budget_agent.analyze(category, amount)
-        if include_steps:
-            steps.append({
-                "agent": "Budget Agent",
+        # One batched Claude call covers all three sub-agents
+        results = self.combined_agent.analyze(user_profile, transaction)
+        for key, agent, description in sub_agents:
+            yield {"step": {
+                "agent": agent.name,
                 "status": "completed",
-                "result": budget_result
-            })
+                "result": results[key]
+            }}
         
-        if include_steps:
-            steps.append({
-                "agent": "Anomaly Agent",
-                "status": "analyzing",
-                "description": "Detecting unusual purchase patterns..."
-            })
-        anomaly_result = self.anomaly_agent.analyze(category, amount)
-        if include_steps:
-            steps.append({
-                "agent": "Anomaly Agent",
-                "status": "completed",
-                "result": anomaly_result
-            })
+        longevity_result = results["longevity"]
+        budget_result = results["budget"]
+        anomaly_result = results["anomaly"]
         
-        if include_steps:
-            steps.append({
-                "agent": "Decision Agent",
-                "status": "analyzing",
-                "description": "Aggregating all signals into final decision..."
-            })
+        yield {"step": {
+            "agent": "Decision Agent",
+            "status": "analyzing",
+            "description": "Aggregating all signals into final decision..."
+        }}
         # Aggregate decision
-        decision = self.decision_agent.aggregate(
-            longevity_result, budget_result, anomaly_result, amount
-        )
-        if include_steps:
-            steps.append({
-                "agent": "Decision Agent",
-                "status": "completed",
-                "result": decision
-            })
+        if self.decision_agent.explain_with_llm:
+            explanation = self.decision_agent.aggregate_stream(
+                longevity_result, budget_result, anomaly_result, amount
+            )
+            while True:
+                try:
+                    yield {"explanation": next(explanation)}
+                except StopIteration as done:
+                    decision = done.value
+                    break
+        else:
+            decision = self.decision_agent.aggregate(
+                longevity_result, budget_result, anomaly_result, amount
+            )
+        yield {"step": {
+            "agent": "Decision Agent",
+            "status": "completed",
+            "result": decision
+        }}
         
         # Add decision to transaction
         transaction['decision'] = decision
         transaction['color'] = decision['color']
         
         # Save transaction
-        DataStore.save_transaction(transaction)
+        if record:
+            DataStore.save_transaction(transaction)
         
-        result = {
+        yield {
             "transaction": transaction,
             "decision": decision
         }
-        
-        if include_steps:
-            result["steps"] = steps
-        
+    
+    def record_purchase(self, result: Dict) -> Dict:
+        """Timestamp and save the transaction of an analysis made with record=False"""
+        result['transaction']['timestamp'] = datetime.now().isoformat()
+        DataStore.save_transaction(result['transaction'])
         return result
     
     def get_dashboard_data(self) -> Dict:
@@ -625,22 +1083,26 @@ class MultiAgentSystem:
         budget = DataStore.load_budget()
         
         # Recent transactions (last 10)
-        recent = sorted(transactions, key=lambda x: x['timestamp'], reverse=True)[:10]
+        # ISO-8601 timestamps sort chronologically as strings
+        recent = heapq.nlargest(10, transactions, key=lambda t: t['timestamp'])
         
         # Category spending this year
         current_year = datetime.now().year
+        spending_map = DataStore.get_all_category_spending(current_year)
         category_spending = {}
         for cat in budget.keys():
             category_spending[cat] = {
                 "budget": budget[cat] * 12,
-                "spent": DataStore.get_category_spending(cat, current_year)
+                "spent": spending_map.get(cat.lower(), 0)
             }
         
-        # Long-term status
-        longevity_agent = LongevityAgent()
-        dummy_transaction = {"amount": 0, "category": "other"}
-        longevity_result = longevity_agent.analyze(user_profile, dummy_transaction)
-        long_term_status = longevity_result.get('status', 'BORDERLINE')
+        # Long-term status (depends only on the profile, so it is memoized)
+        profile_key = tuple(sorted(user_profile.items()))
+        try:
+            long_term_status = _long_term_status(self.longevity_agent, profile_key)
+        except TypeError:
+            # Unhashable profile values; compute without the cache
+            long_term_status = _long_term_status.__wrapped__(self.longevity_agent, profile_key)
         
         return {
             "recent_transactions": recent,
@@ -1,29 +1,422 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, abort, make_response, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 import os
+import re
+import math
+import copy
+import time
+import hashlib
+import uuid
+import threading
 import subprocess
 import json as json_lib
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional
+import msgspec
 from agent import MultiAgentSystem, DataStore
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; falls back to Flask's encoder for other types"""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default), mimetype=self.mimetype
+        )
+
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 app.config['SECRET_KEY'] = os.urandom(24)
 
+# Compress JSON/HTML responses for clients that accept it; SSE streams are left alone
+app.config.update(
+    COMPRESS_ALGORITHM=['zstd', 'br', 'gzip'],
+    COMPRESS_LEVEL=3,
+    COMPRESS_ZSTD_LEVEL=3,
+    COMPRESS_MIN_SIZE=1024,
+    COMPRESS_STREAMS=False
+)
+if Compress is not None:
+    Compress(app)
+
 # Add min function to Jinja2 environment
 app.jinja_env.globals.update(min=min)
 
-# Initialize multi-agent system
-system = MultiAgentSystem()
+# Initialize multi-agent system; EXPLAIN_WITH_LLM=1 has Claude write (and stream) decision explanations
+system = MultiAgentSystem(explain_with_llm=os.getenv('EXPLAIN_WITH_LLM') == '1')
 
 # Categories
-CATEGORIES = [
-    "food", "transportation", "entertainment", 
+CATEGORIES = (
+    "food", "transportation", "entertainment",
     "shopping", "bills", "other"
-]
+)
+CATEGORY_SET = frozenset(CATEGORIES)
+
+# Largest amount accepted for analysis or payment
+MAX_AMOUNT = 1_000_000
+
+
+class PurchaseReq(msgspec.Struct):
+    """Purchase analysis request; unknown categories are filed under 'other'"""
+    amount: float
+    category: str = 'other'
+    
+    def __post_init__(self):
+        if not math.isfinite(self.amount):
+            raise ValueError("Amount must be a finite number")
+        if self.amount < 0.01:
+            raise ValueError("Amount must be at least 0.01")
+        if self.amount > MAX_AMOUNT:
+            raise ValueError(f"Amount must be at most {MAX_AMOUNT:,}")
+        # Analyses, records and payments all use the same whole-cent amount
+        cents = round(self.amount * 100)
+        if abs(self.amount * 100 - cents) > 1e-6:
+            raise ValueError("Amount cannot include fractions of a cent")
+        self.amount = cents / 100
+        if self.category not in CATEGORY_SET:
+            self.category = 'other'
+
+
+class PaymentReq(PurchaseReq):
+    """Locus payment request; request_id refers to an earlier analyze-with-steps result"""
+    recipient: str = ''  # email or address
+    recipient_type: str = 'email'  # 'email' or 'address'
+    memo: Optional[str] = None
+    request_id: Optional[str] = None
+    
+    def __post_init__(self):
+        super().__post_init__()
+        if not self.recipient:
+            raise ValueError("Recipient is required")
+        if self.memo is None:
+            self.memo = f'Payment for {self.category}'
+
+
+# Analyses currently running: key -> (done event, [result]); concurrent calls wait on the first.
+# Finished results are not kept: budget and anomaly results depend on the transaction history,
+# and every analysis served is recorded, so a finished result is stale by the next request.
+_INFLIGHT = {}
+_inflight_lock = threading.Lock()
+INFLIGHT_WAIT = 10
+
+
+def _single_flight_analysis(amount_cents: int, category: str, include_steps: bool):
+    """Analyze a purchase, with concurrent calls for the same key and history sharing one agent run"""
+    def run():
+        return system.analyze_purchase(amount_cents / 100, category, include_steps=include_steps, record=False)
+    
+    key = (amount_cents, category, include_steps, DataStore.history_version())
+    with _inflight_lock:
+        flight = _INFLIGHT.get(key)
+        leader = flight is None
+        if leader:
+            flight = _INFLIGHT[key] = (threading.Event(), [])
+    
+    event, outcome = flight
+    if not leader:
+        if event.wait(timeout=INFLIGHT_WAIT) and outcome:
+            return outcome[0]
+        # The first call failed or is taking too long; analyze independently
+        return run()
+    
+    try:
+        result = run()
+        outcome.append(result)
+        return result
+    finally:
+        with _inflight_lock:
+            _INFLIGHT.pop(key, None)
+        event.set()
+
+
+def _body() -> dict:
+    """Parse the request's JSON object body, aborting with a JSON 400 if it is not one"""
+    try:
+        data = app.json.loads(request.get_data(cache=False) or b'{}')
+    except ValueError:
+        abort(make_response(jsonify({"error": "Request body must be valid JSON"}), 400))
+    if not isinstance(data, dict):
+        abort(make_response(jsonify({"error": "Request body must be a JSON object"}), 400))
+    return data
+
+
+def _decode(req_type):
+    """Decode and validate the request's JSON body as req_type; errors become 400s"""
+    return msgspec.json.decode(request.get_data(cache=False) or b'{}', type=req_type, strict=False)
+
+
+@app.errorhandler(msgspec.DecodeError)
+def bad_request_body(e):
+    """Invalid or malformed request payloads (msgspec.ValidationError included)"""
+    return jsonify({"error": str(e)}), 400
+
+
+def analyze_and_record(amount: float, category: str, include_steps: bool = False):
+    """Analyze and record a purchase"""
+    return record_analysis(_single_flight_analysis(int(round(amount * 100)), category, include_steps))
+
+
+def record_analysis(analysis: dict) -> dict:
+    """Record a copy of an analysis (which may be shared with concurrent callers) as a new transaction"""
+    result = system.record_purchase(copy.deepcopy(analysis))
+    invalidate_dashboard()
+    return result
+
+
+def profile_hard_max() -> Optional[float]:
+    """Return the profile's hard_max as a number, or None if it is unset or not numeric"""
+    hard_max = DataStore.load_user_profile().get('hard_max')
+    if hard_max is None or isinstance(hard_max, bool):
+        return None
+    try:
+        return float(hard_max)
+    except (TypeError, ValueError):
+        return None
+
+
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+_ADDRESS_RE = re.compile(r"0x[0-9a-fA-F]{40}")
+
+
+def validate_recipient(recipient: str, recipient_type: str) -> Optional[str]:
+    """Return an error message if recipient is not a valid email or wallet address, else None"""
+    if recipient_type == 'email':
+        if not _EMAIL_RE.fullmatch(recipient):
+            return "Recipient must be a valid email address"
+    elif recipient_type == 'address':
+        if not _ADDRESS_RE.fullmatch(recipient):
+            return "Recipient must be a 0x-prefixed 40-digit hex address"
+    else:
+        return "Recipient type must be 'email' or 'address'"
+    return None
+
+
+# Dashboard data and its serialized JSON, reused for a couple of seconds between polls
+_DASH_CACHE = {'etag': None, 'body': None, 'data': None, 'ts': 0.0}
+_dash_lock = threading.Lock()
+DASH_TTL = 2.0
+
+
+def dashboard_snapshot() -> dict:
+    """Return the cached dashboard entry, recomputing it once it is older than DASH_TTL"""
+    with _dash_lock:
+        if _DASH_CACHE['body'] is None or time.monotonic() - _DASH_CACHE['ts'] >= DASH_TTL:
+            data = system.get_dashboard_data()
+            body = jsonify(data).get_data()
+            _DASH_CACHE.update(
+                etag=hashlib.blake2s(body).hexdigest(),
+                body=body,
+                data=data,
+                ts=time.monotonic()
+            )
+        return dict(_DASH_CACHE)
+
+
+def invalidate_dashboard():
+    """Force the next dashboard request to recompute"""
+    with _dash_lock:
+        _DASH_CACHE['ts'] = 0.0
+
+
+# Analyses handed out by analyze-with-steps, so a following send-payment can reuse them
+PENDING_ANALYSES = {}  # request id -> (stored at, amount in cents, category, result, history version)
+_pending_lock = threading.Lock()
+PENDING_TTL = 60
+PENDING_SWEEP_AGE = 120
+
+
+def store_pending_analysis(amount: float, category: str, result: dict, history_version: tuple) -> str:
+    """Keep an unrecorded analysis for a follow-up payment and return its request id.
+    
+    history_version is DataStore.history_version() as read before the analysis ran.
+    """
+    request_id = uuid.uuid4().hex
+    now = time.monotonic()
+    with _pending_lock:
+        stale = [rid for rid, entry in PENDING_ANALYSES.items() if now - entry[0] > PENDING_SWEEP_AGE]
+        for rid in stale:
+            del PENDING_ANALYSES[rid]
+        PENDING_ANALYSES[request_id] = (now, int(round(amount * 100)), category, result, history_version)
+    return request_id
+
+
+def take_pending_analysis(request_id: str, amount: float, category: str):
+    """Claim a stored analysis if it is fresh and matches the payment, else None.
+    
+    Stored analyses are not recorded, so the history they ran against never contains the
+    purchase itself. One is only reused if nothing has been recorded since; otherwise the
+    caller re-analyzes against the current history, so the payment is never gated on an
+    outdated decision.
+    """
+    with _pending_lock:
+        entry = PENDING_ANALYSES.pop(request_id, None)
+    if entry is None:
+        return None
+    stored_at, amount_cents, stored_category, result, history_version = entry
+    if time.monotonic() - stored_at >= PENDING_TTL:
+        return None
+    if amount_cents != int(round(amount * 100)) or stored_category != category:
+        return None
+    if history_version != DataStore.history_version():
+        return None
+    return result
+
+
+def clear_pending_analyses():
+    """Drop stored analyses, e.g. after the profile they were made against changed"""
+    with _pending_lock:
+        PENDING_ANALYSES.clear()
+
+
+# Locus bridge location, and its environment captured once after agent.py has loaded .env
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_LOCUS_DIR = os.path.join(_HERE, 'my-locus-app')
+_LOCUS_SCRIPT = os.path.join(_LOCUS_DIR, 'locus_bridge.js')
+_LOCUS_ENV = {**os.environ}
+
+
+def _bridge_line(message: dict) -> bytes:
+    """Encode one bridge request as a JSON line"""
+    if orjson is not None:
+        return orjson.dumps(message) + b"\n"
+    return json_lib.dumps(message).encode() + b"\n"
+
+
+class PaymentStatusUnknown(Exception):
+    """The bridge did not answer in time; the payment may still complete"""
+    
+    def __init__(self, payment_id: str):
+        super().__init__(f"No response for payment {payment_id}")
+        self.payment_id = payment_id
+
+
+class LocusBridge:
+    """Long-lived Node.js process (my-locus-app/locus_bridge.js) that sends Locus payments.
+    
+    Requests and responses are JSON lines matched by id, so concurrent payments
+    share one process. The process is started on first use and restarted if it exits.
+    Payments that time out keep running in Node; their outcome is kept for status().
+    """
+    
+    UNRESOLVED_TTL = 3600
+    
+    def __init__(self, script: str):
+        self.script = script
+        self.cwd = os.path.dirname(script)
+        self.proc = None
+        self.lock = threading.Lock()
+        self.pending = {}  # request id -> (process, Future)
+        self.unresolved = {}  # request id -> (timed out at, Future) for payments that timed out
+    
+    def _ensure_started(self):
+        """Start the Node process if it is not running; call with self.lock held"""
+        if self.proc is not None and self.proc.poll() is None:
+            return
+        self.proc = subprocess.Popen(
+            ['node', self.script],
+            cwd=self.cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=_LOCUS_ENV
+        )
+        threading.Thread(target=self._read_responses, args=(self.proc,), daemon=True).start()
+    
+    def _read_responses(self, proc):
+        """Resolve pending requests from the process's stdout until it exits"""
+        # stdout is read as bytes; orjson (via app.json) parses them without a decode step
+        for line in proc.stdout:
+            try:
+                message = app.json.loads(line)
+            except ValueError:
+                continue
+            # Stray output such as log lines that happen to be valid JSON
+            if not isinstance(message, dict):
+                continue
+            with self.lock:
+                entry = self.pending.pop(message.get('id'), None)
+            if entry is not None:
+                entry[1].set_result(message)
+        
+        # The process exited; reap it and fail whatever was still waiting on it
+        proc.wait()
+        with self.lock:
+            if self.proc is proc:
+                self.proc = None
+            stranded = [rid for rid, (owner, _) in self.pending.items() if owner is proc]
+            futures = [self.pending.pop(rid)[1] for rid in stranded]
+        for future in futures:
+            future.set_exception(RuntimeError("Locus bridge exited"))
+    
+    def send(self, params: dict, timeout: float = 30) -> dict:
+        """Send one payment request and wait for its response"""
+        request_id = uuid.uuid4().hex
+        future = Future()
+        with self.lock:
+            self._ensure_started()
+            self.pending[request_id] = (self.proc, future)
+            try:
+                self.proc.stdin.write(_bridge_line({"id": request_id, **params}))
+                self.proc.stdin.flush()
+            except OSError:
+                self.pending.pop(request_id, None)
+                raise
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # The payment is still in flight, so it can't be treated as failed; leave it
+            # pending so its response is still collected, and report it as unknown
+            now = time.monotonic()
+            with self.lock:
+                expired = [rid for rid, (at, _) in self.unresolved.items() if now - at > self.UNRESOLVED_TTL]
+                for rid in expired:
+                    del self.unresolved[rid]
+                self.unresolved[request_id] = (now, future)
+            raise PaymentStatusUnknown(request_id) from None
+    
+    def status(self, payment_id: str) -> Optional[dict]:
+        """Outcome of a payment that timed out, or None if the id is not known"""
+        with self.lock:
+            entry = self.unresolved.get(payment_id)
+        if entry is None:
+            return None
+        future = entry[1]
+        if not future.done():
+            return {"status": "pending"}
+        if future.exception() is not None:
+            # The bridge exited while the payment was running
+            return {"status": "unknown", "error": str(future.exception())}
+        response = future.result()
+        if response.get('error') is not None:
+            return {"status": "failed", "error": response['error'] or "Payment failed"}
+        return {"status": "completed", "payment": {k: v for k, v in response.items() if k != 'id'}}
+
+
+locus_bridge = LocusBridge(_LOCUS_SCRIPT)
 
 
 @app.route('/')
 def index():
     """Main dashboard"""
-    dashboard_data = system.get_dashboard_data()
+    dashboard_data = dashboard_snapshot()['data']
     return render_template('dashboard.html', **dashboard_data)
 
 
@@ -31,18 +424,12 @@ def index():
 def purchase():
     """Purchase interface"""
     if request.method == 'POST':
+        req = msgspec.convert(request.form.to_dict(), PurchaseReq, strict=False)
         try:
-            amount = float(request.form.get('amount', 0))
-            category = request.form.get('category', 'other')
-            
-            if amount <= 0:
-                return jsonify({"error": "Amount must be positive"}), 400
-            
-            if category not in CATEGORIES:
-                category = 'other'
+            amount, category = req.amount, req.category
             
             # Analyze purchase
-            result = system.analyze_purchase(amount, category)
+            result = analyze_and_record(amount, category)
             
             return jsonify({
                 "success": True,
@@ -56,24 +443,17 @@ def purchase():
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
-    return render_template('purchase.html', categories=CATEGORIES)
+    return render_template('purchase.html', categories=CATEGORIES, max_amount=MAX_AMOUNT)
 
 
 @app.route('/api/analyze', methods=['POST'])
 def api_analyze():
     """API endpoint for purchase analysis"""
+    req = _decode(PurchaseReq)
     try:
-        data = request.get_json()
-        amount = float(data.get('amount', 0))
-        category = data.get('category', 'other')
-        
-        if amount <= 0:
-            return jsonify({"error": "Amount must be positive"}), 400
-        
-        if category not in CATEGORIES:
-            category = 'other'
+        amount, category = req.amount, req.category
         
-        result = system.analyze_purchase(amount, category)
+        result = analyze_and_record(amount, category)
         
         return jsonify({
             "success": True,
@@ -88,8 +468,10 @@ def api_analyze():
 def api_dashboard():
     """API endpoint for dashboard data"""
     try:
-        dashboard_data = system.get_dashboard_data()
-        return jsonify(dashboard_data)
+        snapshot = dashboard_snapshot()
+        response = app.response_class(snapshot['body'], mimetype='application/json')
+        response.set_etag(snapshot['etag'])
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -98,9 +480,12 @@ def api_dashboard():
 def api_profile():
     """API endpoint for user profile"""
     if request.method == 'POST':
+        profile = _body()
         try:
-            profile = request.get_json()
             DataStore.save_user_profile(profile)
+            # The cached dashboard and stored analyses were built from the old profile
+            invalidate_dashboard()
+            clear_pending_analyses()
             return jsonify({"success": True, "profile": profile})
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -112,28 +497,28 @@ def api_profile():
 @app.route('/locus-transaction', methods=['GET'])
 def locus_transaction_page():
     """Locus transaction interface with agent analysis"""
-    return render_template('locus_transaction.html', categories=CATEGORIES)
+    return render_template('locus_transaction.html', categories=CATEGORIES, max_amount=MAX_AMOUNT)
 
 
 @app.route('/api/locus/analyze-with-steps', methods=['POST'])
 def api_locus_analyze_with_steps():
-    """API endpoint for purchase analysis with detailed steps"""
+    """API endpoint for purchase analysis with detailed steps.
+    
+    The purchase is not recorded here; send-payment records it, reusing this analysis
+    when given the returned request_id.
+    """
+    req = _decode(PurchaseReq)
     try:
-        data = request.get_json()
-        amount = float(data.get('amount', 0))
-        category = data.get('category', 'other')
-        
-        if amount <= 0:
-            return jsonify({"error": "Amount must be positive"}), 400
-        
-        if category not in CATEGORIES:
-            category = 'other'
+        amount, category = req.amount, req.category
         
         # Analyze with steps
-        result = system.analyze_purchase(amount, category, include_steps=True)
+        history_version = DataStore.history_version()
+        result = _single_flight_analysis(int(round(amount * 100)), category, True)
+        request_id = store_pending_analysis(amount, category, result, history_version)
         
         return jsonify({
             "success": True,
+            "request_id": request_id,
             "decision": result['decision'],
             "transaction": result['transaction'],
             "steps": result.get('steps', [])
@@ -142,25 +527,75 @@ def api_locus_analyze_with_steps():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/locus/analyze-stream', methods=['POST'])
+def api_locus_analyze_stream():
+    """API endpoint streaming analysis steps as Server-Sent Events.
+    
+    Each event is one {"step": ...} message, or an {"explanation": ...} text chunk when
+    Claude writes the explanation; the last one carries the decision, transaction and a
+    request_id that send-payment accepts. As with analyze-with-steps, nothing is recorded.
+    """
+    req = _decode(PurchaseReq)
+    amount, category = req.amount, req.category
+    
+    def generate():
+        steps = []
+        history_version = DataStore.history_version()
+        try:
+            for message in system.analyze_purchase_stream(amount, category, record=False):
+                if "step" in message:
+                    steps.append(message["step"])
+                elif "decision" in message:
+                    result = {**message, "steps": steps}
+                    request_id = store_pending_analysis(amount, category, result, history_version)
+                    message = {**message, "request_id": request_id}
+                yield f"data: {app.json.dumps(message)}\n\n"
+        except Exception as e:
+            yield f"data: {app.json.dumps({'error': str(e)})}\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
 @app.route('/api/locus/send-payment', methods=['POST'])
 def api_locus_send_payment():
     """API endpoint to send payment via Locus MCP"""
+    req = _decode(PaymentReq)
     try:
-        data = request.get_json()
-        amount = float(data.get('amount', 0))
-        category = data.get('category', 'other')
-        recipient = data.get('recipient', '')  # email or address
-        recipient_type = data.get('recipient_type', 'email')  # 'email' or 'address'
-        memo = data.get('memo', f'Payment for {category}')
+        amount, category = req.amount, req.category
+        recipient, recipient_type, memo = req.recipient, req.recipient_type, req.memo
+        request_id = req.request_id
         
-        if amount <= 0:
-            return jsonify({"error": "Amount must be positive"}), 400
+        # Payments over the profile's hard_max are refused without running the agents
+        hard_max = profile_hard_max()
+        if hard_max is not None and amount > hard_max:
+            decision = {
+                "color": "RED",
+                "explanation": f"This ${amount:,.2f} payment is over your hard limit of ${hard_max:,.2f}.",
+                "auto_invest": 0,
+                "score": 0.0,
+                "agent_results": {}
+            }
+            return jsonify({
+                "success": False,
+                "blocked": True,
+                "reason": "Transaction exceeds your hard spending limit",
+                "decision": decision,
+                "analysis": {"decision": decision}
+            }), 403
         
-        if not recipient:
-            return jsonify({"error": "Recipient is required"}), 400
+        # Checked before any analysis runs, and before claiming a stored analysis so a
+        # corrected retry can still reuse it
+        recipient_error = validate_recipient(recipient, recipient_type)
+        if recipient_error:
+            return jsonify({"error": recipient_error}), 400
         
-        # First analyze the purchase
-        analysis_result = system.analyze_purchase(amount, category, include_steps=True)
+        # Reuse the analysis from analyze-with-steps if the client passed its id and
+        # nothing was recorded since; otherwise analyze the purchase now. Either way the
+        # purchase is recorded once, here.
+        analysis_result = take_pending_analysis(request_id, amount, category) if request_id else None
+        if analysis_result is None:
+            analysis_result = _single_flight_analysis(int(round(amount * 100)), category, True)
+        analysis_result = record_analysis(analysis_result)
         decision_color = analysis_result['decision']['color']
         
         # Block transaction if RED, allow GREEN and WHITE
@@ -174,108 +609,54 @@ def api_locus_send_payment():
             }), 403
         
         # Proceed with transaction for GREEN and WHITE
-        # Call Locus MCP via Node.js script
-        locus_script_path = os.path.join(os.path.dirname(__file__), 'my-locus-app', 'send_payment.js')
-        
-        # Create a temporary script to send payment
-        script_content = f"""
-import 'dotenv/config';
-import {{ query }} from '@anthropic-ai/claude-agent-sdk';
-
-const mcpServers = {{
-  'locus': {{
-    type: 'http',
-    url: 'https://mcp.paywithlocus.com/mcp',
-    headers: {{
-      'Authorization': `Bearer ${{process.env.LOCUS_API_KEY}}`
-    }}
-  }}
-}};
-
-const options = {{
-  mcpServers,
-  allowedTools: ['mcp__locus__*'],
-  apiKey: process.env.ANTHROPIC_API_KEY,
-  canUseTool: async (toolName, input) => {{
-    if (toolName.startsWith('mcp__locus__')) {{
-      return {{ behavior: 'allow', updatedInput: input }};
-    }}
-    return {{ behavior: 'deny' }};
-  }}
-}};
-
-const recipient = '{recipient}';
-const amount = {amount};
-const memo = '{memo}';
-const recipientType = '{recipient_type}';
-
-let result = null;
-let error = null;
-
-for await (const message of query({{
-  prompt: recipientType === 'email' 
-    ? `请使用 send_to_email 工具向邮箱 ${{recipient}} 发送 ${{amount}} USDC，备注为"${{memo}}"` 
-    : `请使用 send_to_address 工具向地址 ${{recipient}} 发送 ${{amount}} USDC，备注为"${{memo}}"`,
-  options
-}})) {{
-  if (message.type === 'result' && message.subtype === 'success') {{
-    result = message.result;
-  }} else if (message.type === 'error_during_execution') {{
-    error = message.error;
-  }}
-}}
-
-if (error) {{
-  console.error(JSON.stringify({{ error: error }}));
-  process.exit(1);
-}} else {{
-  console.log(JSON.stringify({{ success: true, result }}));
-}}
-"""
-        
-        # Write temporary script
-        temp_script = os.path.join(os.path.dirname(__file__), 'my-locus-app', 'temp_send_payment.js')
-        with open(temp_script, 'w') as f:
-            f.write(script_content)
-        
+        # Call Locus MCP via the long-lived Node.js bridge
         try:
-            # Run Node.js script
-            env = os.environ.copy()
-            result = subprocess.run(
-                ['node', temp_script],
-                cwd=os.path.join(os.path.dirname(__file__), 'my-locus-app'),
-                capture_output=True,
-                text=True,
-                timeout=30,
-                env=env
-            )
-            
-            if result.returncode != 0:
-                return jsonify({
-                    "success": False,
-                    "error": result.stderr or "Payment failed",
-                    "analysis": analysis_result
-                }), 500
-            
-            # Parse result
-            locus_result = json_lib.loads(result.stdout)
-            
+            response = locus_bridge.send({
+                "recipient": recipient,
+                "amount": amount,
+                "memo": memo,
+                "type": recipient_type
+            })
+        except PaymentStatusUnknown as e:
+            # Don't report a failure: the payment may still go through, and a blind retry
+            # could pay twice. The client checks payment-status with this id first.
             return jsonify({
-                "success": True,
-                "payment": locus_result,
+                "success": False,
+                "status": "unknown",
+                "payment_id": e.payment_id,
+                "error": "Payment status unknown: Locus did not respond in time. "
+                         "Check /api/locus/payment-status/" + e.payment_id + " before retrying.",
                 "analysis": analysis_result
-            })
-        finally:
-            # Clean up temp script
-            if os.path.exists(temp_script):
-                os.remove(temp_script)
+            }), 504
+        
+        if response.get('error') is not None:
+            return jsonify({
+                "success": False,
+                "error": response['error'] or "Payment failed",
+                "analysis": analysis_result
+            }), 500
+        
+        locus_result = {k: v for k, v in response.items() if k != 'id'}
+        
+        return jsonify({
+            "success": True,
+            "payment": locus_result,
+            "analysis": analysis_result
+        })
         
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "Payment request timed out"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/locus/payment-status/<payment_id>')
+def api_locus_payment_status(payment_id):
+    """API endpoint reporting the outcome of a payment that timed out"""
+    status = locus_bridge.status(payment_id)
+    if status is None:
+        return jsonify({"error": "Unknown payment id"}), 404
+    return jsonify({"payment_id": payment_id, **status})
+
+
 if __name__ == '__main__':
     # Check API key
     if not os.getenv("ANTHROPIC_API_KEY"):
@@ -288,5 +669,6 @@ if __name__ == '__main__':
     print("📊 Dashboard: http://localhost:5001/")
     print("💳 Purchase Interface: http://localhost:5001/purchase")
     print("🌐 Locus Transaction: http://localhost:5001/locus-transaction")
-    app.run(debug=True, port=5001)
+    # Development server only; set FLASK_DEBUG=1 for the debugger (see gevent_app.py for production)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=5001, use_reloader=False)
 
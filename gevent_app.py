@@ -0,0 +1,13 @@
+"""Production entrypoint that serves app.py under gevent.
+
+Run with:
+    gunicorn gevent_app:app    (settings in gunicorn.conf.py)
+
+Monkey-patching happens before the app is imported, so the Anthropic HTTP calls,
+the Locus bridge pipes and DataStore's locks all yield to other greenlets.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+from app import app  # noqa: E402
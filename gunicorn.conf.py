@@ -0,0 +1,23 @@
+"""gunicorn settings for gevent_app.py; picked up automatically from the working directory.
+
+Run with:
+    gunicorn gevent_app:app
+
+Keep a single worker (don't pass -w): the request_id handoff between analyze-with-steps and
+send-payment, and the timed-out payments behind /api/locus/payment-status, live in process
+memory. With several workers a follow-up request can land on a worker that doesn't know the
+id, and a 404 from payment-status invites paying twice. Concurrency comes from gevent instead.
+
+The app is imported once in the master (preload_app) and the worker is forked from it.
+"""
+preload_app = True
+workers = 1
+worker_class = 'gevent'
+worker_connections = 1000
+bind = '127.0.0.1:5001'
+
+
+def post_fork(server, worker):
+    """Start the Locus bridge in the worker rather than inheriting the master's"""
+    import app
+    app.locus_bridge = app.LocusBridge(app._LOCUS_SCRIPT)
@@ -0,0 +1,25 @@
+// Long-lived Locus payment bridge for app.py.
+// Reads one JSON request per line on stdin ({id, recipient, amount, memo, type})
+// and writes one JSON response per line on stdout, echoing the request id.
+import readline from 'node:readline';
+import { sendPayment } from './send_payment.js';
+
+function respond(response) {
+  process.stdout.write(JSON.stringify(response) + '\n');
+}
+
+// Requests are handled concurrently; responses may come back out of order.
+const lines = readline.createInterface({ input: process.stdin });
+lines.on('line', async (line) => {
+  if (!line.trim()) {
+    return;
+  }
+  let id = null;
+  try {
+    const request = JSON.parse(line);
+    id = request.id;
+    respond({ id, ...(await sendPayment(request)) });
+  } catch (err) {
+    respond({ id, error: String(err?.message ?? err) });
+  }
+});
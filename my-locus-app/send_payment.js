@@ -0,0 +1,62 @@
+// Sends one USDC payment through the Locus MCP server.
+// Imported by locus_bridge.js; can also be run directly for a one-off payment:
+//   node send_payment.js '{"recipient": "...", "amount": 5, "memo": "...", "type": "email"}'
+import 'dotenv/config';
+import { fileURLToPath } from 'node:url';
+import { query } from '@anthropic-ai/claude-agent-sdk';
+
+const mcpServers = {
+  'locus': {
+    type: 'http',
+    url: 'https://mcp.paywithlocus.com/mcp',
+    headers: {
+      'Authorization': `Bearer ${process.env.LOCUS_API_KEY}`
+    }
+  }
+};
+
+const options = {
+  mcpServers,
+  allowedTools: ['mcp__locus__*'],
+  apiKey: process.env.ANTHROPIC_API_KEY,
+  canUseTool: async (toolName, input) => {
+    if (toolName.startsWith('mcp__locus__')) {
+      return { behavior: 'allow', updatedInput: input };
+    }
+    return { behavior: 'deny' };
+  }
+};
+
+// Interpolated values are JSON-encoded so quotes in a memo cannot break out of the prompt
+function paymentPrompt({ recipient, amount, memo, type }) {
+  const to = JSON.stringify(String(recipient));
+  const value = JSON.stringify(Number(amount));
+  const note = JSON.stringify(String(memo ?? ''));
+  return type === 'email'
+    ? `请使用 send_to_email 工具向邮箱 ${to} 发送 ${value} USDC，备注为${note}`
+    : `请使用 send_to_address 工具向地址 ${to} 发送 ${value} USDC，备注为${note}`;
+}
+
+export async function sendPayment(params) {
+  let result = null;
+  let error = null;
+
+  for await (const message of query({ prompt: paymentPrompt(params), options })) {
+    if (message.type === 'result' && message.subtype === 'success') {
+      result = message.result;
+    } else if (message.type === 'error_during_execution') {
+      error = message.error;
+    }
+  }
+
+  return error ? { error } : { success: true, result };
+}
+
+if (process.argv[1] === fileURLToPath(import.meta.url)) {
+  try {
+    console.log(JSON.stringify(await sendPayment(JSON.parse(process.argv[2]))));
+  } catch (err) {
+    console.log(JSON.stringify({ error: String(err?.message ?? err) }));
+    process.exitCode = 1;
+  }
+}